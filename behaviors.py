@@ -59,22 +59,19 @@ def choose_velocity(c: Creature, sim) -> None:
 
 def nearest_prey(pred: Creature, sim) -> Creature | None:
     best = None
-    best_d = float("inf")
-    for other in sim.spatial.query_radius(pred.x, pred.y, pred.vision()):
+    best_d2 = float("inf")
+    for d2, other in sim.spatial.query_radius_d2(pred.x, pred.y, pred.vision()):
         if other.dead or other.species != Species.HERBIVORE:
             continue
-        d = sim.world.torus_distance(pred.x, pred.y, other.x, other.y)
-        if d < best_d:
-            best_d, best = d, other
+        if d2 < best_d2:
+            best_d2, best = d2, other
     return best
 
 
 def local_density(c: Creature, sim, radius: float = 40.0) -> float:
     count = 0
-    for other in sim.spatial.query_radius(c.x, c.y, radius):
-        if other.dead:
-            continue
-        if sim.world.torus_distance(c.x, c.y, other.x, other.y) <= radius:
+    for _, other in sim.spatial.query_radius_d2(c.x, c.y, radius):
+        if not other.dead:
             count += 1
     return float(max(0, count - 1))
 
@@ -89,11 +86,11 @@ def feed_herbivore(c: Creature, sim) -> None:
 def predation(pred: Creature, sim) -> None:
     if pred.cooldown > 0:
         return
-    for prey in sim.spatial.query_radius(pred.x, pred.y, pred.radius() + 4.0):
+    for d2, prey in sim.spatial.query_radius_d2(pred.x, pred.y, pred.radius() + 4.0):
         if prey.dead or prey.species != Species.HERBIVORE:
             continue
-        d = sim.world.torus_distance(pred.x, pred.y, prey.x, prey.y)
-        if d < pred.radius() + prey.radius():
+        reach = pred.radius() + prey.radius()
+        if d2 < reach * reach:
             prey.hp -= pred.attack()
             pred.energy -= sim.params["bite_cost"]
             pred.cooldown = sim.params["cooldown_ticks"]
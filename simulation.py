@@ -3,6 +3,8 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 import random
+import sys
+import time
 
 from behaviors import choose_velocity, feed_herbivore, local_density, predation, reproduction_phase, update_metabolism
 from creature import Creature, Species, random_creature
@@ -22,6 +24,7 @@ class SimConfig:
     herbivores: int = 140
     carnivores: int = 40
     seed: int = 7
+    reorder_interval: int = 0  # ticks between Z-order re-sorts of the sweep view; 0 disables
 
 
 class Simulation:
@@ -63,10 +66,15 @@ class Simulation:
         for _ in range(cfg.carnivores):
             self.creatures.append(random_creature(Species.CARNIVORE, self.rng.uniform(0, cfg.width), self.rng.uniform(0, cfg.height), self.rng))
 
+        # Z-order view of `creatures` for order-independent sweeps; `creatures` itself stays in
+        # spawn (id) order so rng draws, feeding and predation resolve the same way either way.
+        # Left empty when reordering is off so it never pins dead creatures.
+        self.zorder: list[Creature] = list(self.creatures) if cfg.reorder_interval > 0 else []
         self.spatial = SpatialHash(self.world, cell_size=80.0)
         self.tick = 0
         self.logger = SimLogger(interval=10)
         self.last_father = {}
+        self.perf = {"reorder_s": 0.0, "reorders": 0, "step_s": 0.0, "steps": 0, "density_s": 0.0}
 
     def cell_of(self, c: Creature) -> tuple[int, int]:
         nx, ny = self.nutrition.nx, self.nutrition.ny
@@ -74,21 +82,36 @@ class Simulation:
         j = int(c.y / self.world.height * ny) % ny
         return i, j
 
+    def reorder_creatures(self) -> None:
+        """Sort the sweep view by Z-order of each creature's spatial cell."""
+        t0 = time.perf_counter()
+        key = self.spatial.morton_key
+        self.zorder = sorted(self.creatures, key=lambda c: (key(c.x, c.y), c.id))
+        self.perf["reorder_s"] += time.perf_counter() - t0
+        self.perf["reorders"] += 1
+
     def step(self) -> None:
+        t0 = time.perf_counter()
         self.tick += 1
+        # 0. periodic Z-order reorder
+        if self.cfg.reorder_interval > 0 and self.tick % self.cfg.reorder_interval == 0:
+            self.reorder_creatures()
+        sweep = self.zorder if self.cfg.reorder_interval > 0 else self.creatures
         # 1. spatial hash rebuild
         self.spatial.rebuild(self.creatures)
         # 2. local density
-        for c in self.creatures:
+        t_density = time.perf_counter()
+        for c in sweep:
             if not c.dead:
                 c.density = local_density(c, self)
+        self.perf["density_s"] += time.perf_counter() - t_density
         # 3. behavior decision
         for c in self.creatures:
             if c.dead:
                 continue
             choose_velocity(c, self)
         # 4. move
-        for c in self.creatures:
+        for c in sweep:
             if c.dead:
                 continue
             c.x, c.y = self.world.wrap_position(c.x + c.vx, c.y + c.vy)
@@ -106,7 +129,7 @@ class Simulation:
             if not c.dead and c.species == Species.CARNIVORE:
                 predation(c, self)
         # 7. metabolism
-        for c in self.creatures:
+        for c in sweep:
             if not c.dead:
                 update_metabolism(c, self)
         # 8. reproduction
@@ -114,18 +137,45 @@ class Simulation:
         self.creatures.extend(births)
         # 9. remove dead
         self.creatures = [c for c in self.creatures if not c.dead]
+        if self.cfg.reorder_interval > 0:
+            self.zorder = [c for c in self.zorder if not c.dead] + births
         # 10. nutrition update
         self.nutrition.update()
         # 11. logging
         self.logger.maybe_log(self)
+        self.perf["step_s"] += time.perf_counter() - t0
+        self.perf["steps"] += 1
 
     def run(self, ticks: int) -> None:
         for _ in range(ticks):
             self.step()
 
 
+def benchmark(ticks: int = 300, reorder_interval: int = 50) -> None:
+    """Same-seed comparison of step and density-sweep time with Z-order reordering off and on."""
+    for interval in (0, reorder_interval):
+        sim = Simulation(SimConfig(reorder_interval=interval))
+        sim.run(ticks)
+        p = sim.perf
+        step_ms = 1000.0 * p["step_s"] / max(1, p["steps"])
+        density_ms = 1000.0 * p["density_s"] / max(1, p["steps"])
+        reorder_ms = 1000.0 * p["reorder_s"] / max(1, p["steps"])
+        print(
+            f"bench reorder_interval={interval}: step={step_ms:.3f}ms/tick, density={density_ms:.3f}ms/tick, "
+            f"reorder={reorder_ms:.3f}ms/tick, creatures={len(sim.creatures)}"
+        )
+
+
 if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        benchmark()
+        sys.exit()
     sim = Simulation(SimConfig())
     sim.run(1000)
     sim.logger.write_csv("outputs/sim_log.csv")
     print(f"done: tick={sim.tick}, creatures={len(sim.creatures)}")
+    p = sim.perf
+    step_ms = 1000.0 * p["step_s"] / max(1, p["steps"])
+    print(f"perf: step={step_ms:.3f}ms/tick")
+    q = sim.spatial.stats
+    print(f"spatial: queries={q['queries']}, scanned/returned={sim.spatial.scan_ratio():.2f}, levels={len(sim.spatial.grids)}, finest_cell={sim.spatial.grids[-1].cell_size:.2f}")
@@ -1,8 +1,8 @@
-"""Uniform grid spatial hash for neighbor queries on torus."""
+"""Multi-level uniform grid spatial hash for neighbor queries on torus."""
 from __future__ import annotations
 
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict, Iterable, List, Tuple
 import math
 
@@ -10,36 +10,171 @@ from creature import Creature
 from world import World
 
 
+class _Grid:
+    """One level of the hierarchy; cells tile the torus exactly so wrap-around stays correct."""
+
+    def __init__(self, world: World, cell_size: float):
+        self.cols = max(1, int(world.width // cell_size))
+        self.rows = max(1, int(world.height // cell_size))
+        self.cell_w = world.width / self.cols
+        self.cell_h = world.height / self.rows
+        self.cell_size = min(self.cell_w, self.cell_h)
+        self.cells: Dict[Tuple[int, int], List[Creature]] = defaultdict(list)
+
+    def key(self, x: float, y: float) -> tuple[int, int]:
+        return int(x // self.cell_w) % self.cols, int(y // self.cell_h) % self.rows
+
+
 @dataclass
 class SpatialHash:
     world: World
-    cell_size: float
+    cell_size: float  # coarsest level; each finer level halves it
+    min_occupancy: float = 1.05  # a level must average this many per occupied cell to be refined
+    rebalance_interval: int = 50  # rebuilds between occupancy checks
+    stats: dict = field(default_factory=lambda: {"queries": 0, "scanned": 0, "returned": 0, "min_radius": math.inf})
 
     def __post_init__(self) -> None:
-        self.cols = max(1, int(math.ceil(self.world.width / self.cell_size)))
-        self.rows = max(1, int(math.ceil(self.world.height / self.cell_size)))
-        self.cells: Dict[Tuple[int, int], List[Creature]] = defaultdict(list)
+        self.grids = [_Grid(self.world, self.cell_size)]
+        self._radii: set[float] = set()  # distinct query radii since the last rebalance
+        self._rebuilds = 0
 
     def clear(self) -> None:
-        self.cells.clear()
+        for g in self.grids:
+            g.cells.clear()
 
-    def _key(self, x: float, y: float) -> tuple[int, int]:
-        return int(x / self.cell_size) % self.cols, int(y / self.cell_size) % self.rows
+    def morton_key(self, x: float, y: float) -> int:
+        """Z-order code of the coarsest cell containing (x, y)."""
+        cx, cy = self.grids[0].key(x, y)
+        return _interleave(cx) | (_interleave(cy) << 1)
 
     def insert(self, c: Creature) -> None:
-        self.cells[self._key(c.x, c.y)].append(c)
+        for g in self.grids:
+            g.cells[g.key(c.x, c.y)].append(c)
 
     def rebuild(self, creatures: Iterable[Creature]) -> None:
+        live = [c for c in creatures if not c.dead]
+        if self._rebuilds % self.rebalance_interval == 0 or self.stats["min_radius"] == math.inf:
+            self.rebalance(live)
+        self._rebuilds += 1
         self.clear()
-        for c in creatures:
-            if not c.dead:
-                self.insert(c)
+        for c in live:
+            self.insert(c)
+
+    def rebalance(self, creatures: list[Creature]) -> None:
+        """Rebuild the ladder from occupancy and recent query radii, keeping only levels queries would use."""
+        radii, self._radii = self._radii, set()
+        ladder = [_Grid(self.world, self.cell_size)]
+        if radii:
+            r_min = min(radii)
+            self.stats["min_radius"] = min(self.stats["min_radius"], r_min)
+            size = self.cell_size
+            while True:
+                finest = ladder[-1]
+                occupied = {finest.key(c.x, c.y) for c in creatures}
+                if not occupied or len(creatures) / len(occupied) < self.min_occupancy:
+                    break
+                size /= 2.0
+                finer = _Grid(self.world, size)
+                if finer.cell_size < r_min:
+                    break
+                ladder.append(finer)
+        used = {0}
+        for r in radii:
+            k = 0
+            while k + 1 < len(ladder) and ladder[k + 1].cell_size >= r:
+                k += 1
+            used.add(k)
+        self.grids = [g for k, g in enumerate(ladder) if k in used]
+
+    def level_for(self, radius: float) -> _Grid:
+        """Finest level whose cells are at least `radius` wide."""
+        best = self.grids[0]
+        for g in self.grids[1:]:
+            if g.cell_size < radius:
+                break
+            best = g
+        return best
 
     def query_radius(self, x: float, y: float, radius: float) -> list[Creature]:
-        cx, cy = self._key(x, y)
-        reach = int(math.ceil(radius / self.cell_size))
-        out: list[Creature] = []
-        for dx in range(-reach, reach + 1):
-            for dy in range(-reach, reach + 1):
-                out.extend(self.cells.get(((cx + dx) % self.cols, (cy + dy) % self.rows), []))
+        """Creatures within `radius` (torus distance) of (x, y)."""
+        return [c for _, c in self.query_radius_d2(x, y, radius)]
+
+    def query_radius_d2(self, x: float, y: float, radius: float) -> list[tuple[float, Creature]]:
+        """Like `query_radius`, paired with each neighbour's squared torus distance."""
+        self._radii.add(radius)
+        g = self.level_for(radius)
+        cx, cy = g.key(x, y)
+        reach = int(math.ceil(radius / g.cell_size))
+        xs = _wrapped_span(cx, reach, g.cols)
+        ys = _wrapped_span(cy, reach, g.rows)
+        w, h = self.world.width, self.world.height
+        r2 = radius * radius
+        scanned = 0
+        out: list[tuple[float, Creature]] = []
+        cells = g.cells
+        for i in xs:
+            for j in ys:
+                bucket = cells.get((i, j))
+                if not bucket:
+                    continue
+                scanned += len(bucket)
+                for c in bucket:
+                    ddx = (c.x - x + w / 2.0) % w - w / 2.0
+                    ddy = (c.y - y + h / 2.0) % h - h / 2.0
+                    d2 = ddx * ddx + ddy * ddy
+                    if d2 <= r2:
+                        out.append((d2, c))
+        self.stats["queries"] += 1
+        self.stats["scanned"] += scanned
+        self.stats["returned"] += len(out)
         return out
+
+    def scan_ratio(self) -> float:
+        """Candidates scanned per neighbour returned, over all queries so far."""
+        return self.stats["scanned"] / max(1, self.stats["returned"])
+
+
+def _wrapped_span(center: int, reach: int, n: int) -> range | list[int]:
+    """Cell indices within `reach` of `center` on a ring of n cells, without duplicates."""
+    if 2 * reach + 1 >= n:
+        return range(n)
+    return [(center + d) % n for d in range(-reach, reach + 1)]
+
+
+def _interleave(v: int) -> int:
+    """Spread the low 16 bits of v so they occupy the even bit positions."""
+    v &= 0xFFFF
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+
+
+if __name__ == "__main__":
+    # Brute-force check against World.torus_distance, including unwrapped coordinates
+    # (newborns are spawned at mother.x +/- 2 without wrapping).
+    import random
+
+    from creature import Species, random_creature
+
+    rng = random.Random(0)
+    world = World(1024.0, 1024.0)
+    sh = SpatialHash(world, cell_size=80.0)
+    creatures = [
+        random_creature(Species.HERBIVORE, rng.uniform(-3.0, 1027.0), rng.uniform(-3.0, 1027.0), rng)
+        for _ in range(3000)
+    ]
+    seam = [random_creature(Species.HERBIVORE, rng.uniform(-2.0, 0.0), rng.uniform(0.0, 1024.0), rng) for _ in range(50)]
+    creatures += seam
+    for r in (4.5, 10.0, 20.0, 40.0, 80.0):
+        sh.query_radius(0.0, 0.0, r)
+    sh.rebuild(creatures)
+    queries = [(rng.uniform(-3.0, 1027.0), rng.uniform(-3.0, 1027.0), rng.choice((4.5, 5.54, 7.5, 10.0, 20.0, 40.0, 80.0))) for _ in range(500)]
+    queries += [((c.x % world.width) - 0.95 * r, c.y, r) for c in seam for r in (4.5, 10.0, 20.0, 40.0)]
+    mismatches = 0
+    for x, y, r in queries:
+        got = {c.id for c in sh.query_radius(x, y, r)}
+        want = {c.id for c in creatures if world.torus_distance(x, y, c.x, c.y) <= r}
+        mismatches += got != want
+    print(f"levels={[round(g.cell_size, 2) for g in sh.grids]}, mismatches={mismatches}/{len(queries)}")